@@ -1,11 +1,28 @@
 import streamlit as st
-from PIL import Image
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 import numpy as np
+import os
+import atexit
+from math import isfinite
 import tempfile
+import struct
 import subprocess
-import imageio
+import platform
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from dataclasses import dataclass
 import imageio_ffmpeg as ffmpeg
-import cv2
+
+# OpenCV and PyAV are only needed once a video is uploaded, so they are imported
+# on first use and the landing page renders without paying their load time.
+def _cv2():
+    """Import OpenCV (configured for single-frame work) on first use."""
+    import cv2
+    # Frames are processed one at a time per click; OpenCV's worker pool on top of
+    # Streamlit's script threads only adds scheduling overhead for these small ops
+    cv2.setNumThreads(1)
+    cv2.setUseOptimized(True)
+    return cv2
 
 # ---------- Page config ----------
 st.set_page_config(
@@ -16,102 +33,313 @@ st.set_page_config(
 )
 
 # ---------- Video utilities ----------
+@st.cache_data(show_spinner=False, hash_funcs={UploadedFile: lambda f: f.file_id})
 def save_uploaded_video(uploaded_file):
-    """Save uploaded file to a temporary location and return the path."""
+    """Save uploaded file to a temporary location (once per upload) and return the path."""
     suffix = "." + uploaded_file.name.split(".")[-1] if "." in uploaded_file.name else ".mp4"
-    tfile = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    tfile.write(uploaded_file.read())
-    tfile.flush()
+    # The upload is already held in memory, so write it straight from a view of
+    # that buffer rather than copying it out in chunks
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tfile, uploaded_file.getbuffer() as view:
+        tfile.write(view)
+    atexit.register(remove_temp_file, tfile.name)
     return tfile.name
 
 
+def remove_temp_file(path):
+    """Delete a temp file, ignoring files that are already gone or still locked."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Hardware decode devices to try, in order of preference, per OS
+HWACCEL_DEVICES = {
+    "Linux": ["cuda", "vaapi"],
+    "Darwin": ["videotoolbox"],
+    "Windows": ["cuda", "d3d11va", "dxva2"],
+}
+
+
+@st.cache_resource(show_spinner=False)
+def hwaccel_state():
+    """
+    Hardware decode devices worth trying on this server (one per process).
+    hwdevices_available() only lists device types built into FFmpeg, not ones
+    that work here, so `device` is set once a container actually opens on one
+    and devices that fail to open are never tried again.
+    """
+    try:
+        from av.codec.hwaccel import hwdevices_available
+    except ImportError:  # PyAV < 14 has no hardware decoding support
+        return {"device": None, "candidates": []}
+    available = hwdevices_available()
+    return {
+        "device": None,
+        "candidates": [d for d in HWACCEL_DEVICES.get(platform.system(), []) if d in available],
+    }
+
+
+def _open_container(video_path):
+    """Open `video_path` on the first hardware device that works; return (container, device or None)."""
+    import av
+
+    state = hwaccel_state()
+    failed = []
+    for device in [state["device"]] if state["device"] else list(state["candidates"]):
+        try:
+            from av.codec.hwaccel import HWAccel
+            hwaccel = HWAccel(device_type=device, allow_software_fallback=True)
+            container = av.open(video_path, hwaccel=hwaccel)
+        except Exception:
+            failed.append(device)
+            continue
+        state["device"] = device
+        return container, device
+
+    container = av.open(video_path)  # raises for files that cannot be read at all
+    # The file opens in software, so the failures above were the devices' fault
+    for device in failed:
+        if device in state["candidates"]:
+            state["candidates"].remove(device)
+        if state["device"] == device:
+            state["device"] = None
+    return container, None
+
+
+@dataclass
+class ReaderCtx:
+    """An open PyAV container plus the video stream metadata, read once at open time."""
+    container: object
+    stream: object
+    fps: object      # float, or None when the stream has no frame rate
+    nframes: object  # validated int, or None when unknown
+    hwaccel: object  # hardware device type the container was opened with, or None
+    # Decoder position, so short forward steps keep decoding instead of re-seeking
+    frames: object = None    # generator of decoded frames since the last seek
+    last_pts: object = None  # pts of the last frame taken from `frames`
+
+
+# Targets at most this many frames past the decoder position are reached by
+# decoding forward; anything else (or any backward step) seeks again
+SEQUENTIAL_WINDOW_FRAMES = 30
+
+
+# Evicted containers are released and closed by PyAV on deallocation
+@st.cache_resource(show_spinner=False, max_entries=4)
 def load_video_reader(video_path):
-    """Create an imageio video reader (FFmpeg-based)."""
-    return imageio.get_reader(video_path, "ffmpeg")
+    """Open a PyAV container (once per path), decoding on the GPU when available."""
+    container, device = _open_container(video_path)
+
+    stream = container.streams.video[0]
+    stream.thread_type = "AUTO"
+    return ReaderCtx(
+        container=container,
+        stream=stream,
+        fps=float(stream.average_rate) if stream.average_rate else None,
+        nframes=_safe_int_frames(stream.frames or None),
+        hwaccel=device,
+    )
 
 
-def check_has_audio(video_path):
-    """Check if video file has an audio stream using ffmpeg."""
-    ffmpeg_binary = ffmpeg.get_ffmpeg_exe()
-    cmd = [ffmpeg_binary, "-i", video_path]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    # FFmpeg prints stream info to stderr; search for 'Audio:'
-    return "Audio:" in proc.stderr
+def check_has_audio(container):
+    """Check if the already-open container has an audio stream."""
+    return any(s.type == "audio" for s in container.streams)
 
 
 def _safe_int_frames(nframes):
     """Convert nframes from metadata to a safe int or None."""
-    if nframes is None:
-        return None
     try:
-        if isinstance(nframes, (float, np.floating)):
-            if not np.isfinite(nframes):
-                return None
-            if nframes > 1e9:  # absurdly large, treat as unknown
-                return None
-        value = int(nframes)
-        if value < 0:
-            return None
-        return value
-    except Exception:
+        value = float(nframes)
+    except (TypeError, ValueError):
         return None
+    # Non-finite, negative and absurdly large counts are all treated as unknown
+    return int(value) if isfinite(value) and 0 <= value < 1e9 else None
+
 
+@st.cache_data(show_spinner=False)
+def get_video_properties(_video_reader, video_path):
+    import av
 
-def get_video_properties(video_reader, video_path):
-    meta = video_reader.get_meta_data()
+    container = _video_reader.container
+    stream = _video_reader.stream
 
-    fps = meta.get("fps", None)
-    duration = meta.get("duration", None)
-    nframes_raw = meta.get("nframes", None)
-    nframes = _safe_int_frames(nframes_raw)
-    size = meta.get("size", None)
+    fps = _video_reader.fps
+    duration = None
+    if stream.duration is not None:
+        duration = float(stream.duration * stream.time_base)
+    elif container.duration is not None:
+        duration = container.duration / av.time_base
+    nframes = _video_reader.nframes
 
     # Fallback for duration if not provided
     if duration is None and fps and nframes is not None and fps > 0:
         duration = nframes / fps
 
-    width, height = (size if size is not None else (None, None))
-    has_audio = check_has_audio(video_path)
+    audio_codec = None
+    if container.streams.audio:
+        # Codec ID name ("mp3", "aac"), not the decoder name ("mp3float")
+        audio_codec = container.streams.audio[0].codec.canonical_name
+
+    # Report whether decoding actually runs on the hardware device
+    hw_device = _video_reader.hwaccel if getattr(stream.codec_context, "is_hwaccel", False) else None
+
+    width = stream.codec_context.width or None
+    height = stream.codec_context.height or None
+    has_audio = check_has_audio(container)
 
     return {
         "Width": width,
         "Height": height,
-        "Duration (s)": round(duration, 2) if duration is not None and np.isfinite(duration) else None,
-        "FPS": round(fps, 2) if fps is not None and np.isfinite(fps) else None,
+        "Duration (s)": round(duration, 2) if duration is not None and isfinite(duration) else None,
+        "FPS": round(fps, 2) if fps is not None and isfinite(fps) else None,
         "Frames": nframes,
         "Has audio": has_audio,
-        "Backend": meta.get("plugin", "ffmpeg")
+        "Audio codec": audio_codec,
+        "Backend": f"pyav ({hw_device})" if hw_device else "pyav"
     }
 
 
-def get_frame_image(video_reader, time_sec):
-    """Get a frame (as PIL image) at a given time in seconds."""
-    meta = video_reader.get_meta_data()
-    fps = meta.get("fps", 1.0) or 1.0
-    nframes_raw = meta.get("nframes", None)
-    nframes = _safe_int_frames(nframes_raw)
+def _demux_from(container, stream, target_pts):
+    """
+    Seek to the last keyframe presented at or before `target_pts` and return
+    the stream's packets from there. The keyframe seek matches on dts, so with
+    open GOPs it can land on the keyframe just after the target, whose leading
+    B-frames (the target among them) need the previous GOP: step back a
+    keyframe at a time until the first one is not past the target.
+    """
+    seek_pts, landed = target_pts, None
+    while True:
+        container.seek(seek_pts, backward=True, any_frame=False, stream=stream)
+        packets = container.demux(stream)
+        first = next(packets, None)
+        if first is None:
+            return packets
+        if first.pts is None or first.dts is None or first.pts <= target_pts or first.pts == landed:
+            # At or before the target, or already the earliest keyframe we can reach
+            return chain([first], packets)
+        landed = first.pts
+        seek_pts = max(first.dts - 1, stream.start_time or 0)
+
+
+def _decode_from(container, stream, target_pts):
+    """
+    Yield decoded frames starting from the GOP that contains `target_pts`.
+    Packets of earlier GOPs reached by the keyframe seek are demuxed but
+    never sent to the decoder.
+    """
+    pending = []  # packets of the current GOP, held back until we know we need them
+    for packet in _demux_from(container, stream, target_pts):
+        if pending is not None:
+            if packet.is_keyframe and packet.pts is not None and packet.pts <= target_pts:
+                # A later keyframe still precedes the target: drop the earlier GOP undecoded
+                pending = [packet]
+                continue
+            if packet.dts is not None and not packet.is_keyframe:
+                pending.append(packet)
+                continue
+            # Next GOP (or end of stream) reached, so the target is in the pending packets
+            packets, pending = pending + [packet], None
+        else:
+            packets = [packet]
+
+        for p in packets:
+            yield from p.decode()
+
+
+def _next_frame_at(frames, target_pts):
+    """
+    Advance a decoded-frame generator to the first frame at or after
+    `target_pts`; past the end of the stream, return the last frame (or None).
+    """
+    frame = None
+    for frame in frames:
+        if frame.pts is not None and frame.pts >= target_pts:
+            break
+    return frame
+
 
-    index = int(time_sec * fps)
+# cache_resource hands back the cached array itself; cache_data would pickle it
+# on store and unpickle a fresh full-frame copy on every hit
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _decode_bgr(_video_reader, video_path, index):
+    """
+    Decode frame `index` of the video as a BGR array (cached per path and index).
+    The array is shared across reruns and read-only: copy before drawing on it.
+    """
+    stream = _video_reader.stream
+    time_sec = index / (_video_reader.fps or 1.0)
+    # Timestamps are relative to the stream start, which is often not pts 0;
+    # round rather than truncate so float error cannot land on the previous frame
+    target_pts = (stream.start_time or 0) + round(time_sec / stream.time_base)
+
+    frame = None
+    last_pts = _video_reader.last_pts
+    window = round(SEQUENTIAL_WINDOW_FRAMES / (_video_reader.fps or 1.0) / stream.time_base)
+    if _video_reader.frames is not None and last_pts is not None and last_pts < target_pts <= last_pts + window:
+        frame = _next_frame_at(_video_reader.frames, target_pts)
+    if frame is None:
+        _video_reader.frames = _decode_from(_video_reader.container, stream, target_pts)
+        frame = _next_frame_at(_video_reader.frames, target_pts)
+    if frame is None:
+        _video_reader.frames = None
+        raise ValueError(f"No video frame could be decoded at {time_sec} s")
+    _video_reader.last_pts = frame.pts
+
+    # Let libswscale produce OpenCV's channel order directly: no cvtColor pass later
+    bgr = frame.to_ndarray(format="bgr24")  # numpy array (H,W,3) in BGR
+    bgr.flags.writeable = False
+    return bgr
+
+
+def get_frame_index(video_reader, time_sec):
+    """Map a time in seconds to a valid frame index of the video."""
+    nframes = video_reader.nframes
+
+    index = int(time_sec * (video_reader.fps or 1.0))
     if nframes is not None:
         index = max(0, min(index, nframes - 1))
     else:
         index = max(0, index)
+    return index
+
 
-    frame = video_reader.get_data(index)  # numpy array (H,W,3) in RGB
-    img = Image.fromarray(frame.astype(np.uint8))
-    return img
+# Source audio codecs that can be remuxed without re-encoding: codec -> (muxer, mime)
+COPY_AUDIO_FORMATS = {
+    "mp3": ("mp3", "audio/mpeg"),
+    "aac": ("adts", "audio/aac"),
+}
 
 
-def extract_audio_bytes(video_path, format_ext="mp3", speed=1.0, start_time=None, end_time=None):
+def _fix_wav_sizes(data):
+    """
+    Fill in the RIFF and data chunk sizes of a WAV written to a pipe, where
+    ffmpeg cannot seek back and leaves them as 0xFFFFFFFF.
+    """
+    data = bytearray(data)
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return bytes(data)
+    struct.pack_into("<I", data, 4, min(len(data) - 8, 0xFFFFFFFF))
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        if chunk_id == b"data":
+            struct.pack_into("<I", data, offset + 4, min(len(data) - offset - 8, 0xFFFFFFFF))
+            break
+        (size,) = struct.unpack_from("<I", data, offset + 4)
+        offset += 8 + size + (size & 1)  # chunks are padded to an even length
+    return bytes(data)
+
+
+def extract_audio_bytes(video_path, format_ext="mp3", speed=1.0, start_time=None, end_time=None, copy=False):
     """
     Extract audio track from video (optionally trimmed & speed-changed)
     and return (bytes, mime). Returns (None, None) if extraction fails.
+    With copy=True the source packets are remuxed as-is; format_ext must then
+    be the source codec (a key of COPY_AUDIO_FORMATS) and speed is ignored.
     """
     ffmpeg_binary = ffmpeg.get_ffmpeg_exe()
-    tmp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=f".{format_ext}")
-    tmp_audio.close()
-
-    cmd = [ffmpeg_binary, "-y"]
+    cmd = [ffmpeg_binary]
 
     # Optional start / end trimming
     if start_time is not None and start_time >= 0:
@@ -122,11 +350,15 @@ def extract_audio_bytes(video_path, format_ext="mp3", speed=1.0, start_time=None
     cmd.extend(["-i", video_path, "-vn"])  # no video
 
     # Audio codec / container
-    if format_ext.lower() == "wav":
-        cmd.extend(["-acodec", "pcm_s16le"])
+    if copy:
+        muxer, mime = COPY_AUDIO_FORMATS[format_ext.lower()]
+        cmd.extend(["-c:a", "copy", "-f", muxer])
+        speed = 1.0  # filters need decoded audio, so no speed change on copy
+    elif format_ext.lower() == "wav":
+        cmd.extend(["-acodec", "pcm_s16le", "-f", "wav"])
         mime = "audio/wav"
     else:  # default mp3
-        cmd.extend(["-acodec", "mp3"])
+        cmd.extend(["-acodec", "mp3", "-f", "mp3"])
         mime = "audio/mpeg"
 
     # Speed change (atempo supports 0.5 to 2.0)
@@ -137,38 +369,46 @@ def extract_audio_bytes(video_path, format_ext="mp3", speed=1.0, start_time=None
         speed = max(0.5, min(speed, 2.0))
         cmd.extend(["-filter:a", f"atempo={speed}"])
 
-    cmd.append(tmp_audio.name)
+    cmd.append("pipe:1")  # write the encoded audio to stdout instead of a temp file
 
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
 
-    if proc.returncode != 0:
+    if proc.returncode != 0 or not proc.stdout:
         return None, None
 
-    try:
-        with open(tmp_audio.name, "rb") as f:
-            data = f.read()
-    except Exception:
-        return None, None
-
-    if not data:
-        return None, None
+    if mime == "audio/wav":
+        return _fix_wav_sizes(proc.stdout), mime
+    return proc.stdout, mime
 
-    return data, mime
+@st.cache_resource(show_spinner=False)
+def get_audio_executor():
+    """Worker pool that runs audio extraction off the script thread (one per server)."""
+    return ThreadPoolExecutor(max_workers=2)
 
 # ---------- Frame/image utilities (same logic as image app) ----------
-def pil_to_bgr(pil_img):
-    rgb = np.array(pil_img)
-    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
-    return bgr
-
-def bgr_to_pil(img_bgr):
-    rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    return Image.fromarray(rgb)
+def encode_jpeg(img_bgr, quality=85):
+    """Encode a BGR (or grayscale) image as JPEG bytes for st.image."""
+    cv2 = _cv2()
+    ok, buf = cv2.imencode(".jpg", img_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+def preview_jpeg(img_bgr, max_size=(960, 540), quality=85):
+    """Downscale to roughly the display width and encode as JPEG bytes for st.image."""
+    h, w = img_bgr.shape[:2]
+    scale = min(max_size[0] / w, max_size[1] / h)
+    if scale < 1:
+        cv2 = _cv2()
+        img_bgr = cv2.resize(img_bgr, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(img_bgr, quality)
 
 def to_grayscale(img_bgr):
+    cv2 = _cv2()
     return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
 
 def rotate_image(img_bgr, angle):
+    cv2 = _cv2()
     if angle == 90:
         return cv2.rotate(img_bgr, cv2.ROTATE_90_CLOCKWISE)
     elif angle == 180:
@@ -178,7 +418,7 @@ def rotate_image(img_bgr, angle):
     return img_bgr
 
 def mirror_image(img_bgr):
-    return cv2.flip(img_bgr, 1)
+    return img_bgr[:, ::-1]  # strided view; the consumer's copy is the only one
 
 def make_grid(img_bgr, rows=4, cols=4):
     h, w = img_bgr.shape[:2]
@@ -186,35 +426,179 @@ def make_grid(img_bgr, rows=4, cols=4):
     cell_w = max(1, w // cols)
     grid = img_bgr.copy()
 
-    for r in range(1, rows):
-        y = r * cell_h
-        cv2.line(grid, (0, y), (w, y), (24, 165, 135), 1)
-
-    for c in range(1, cols):
-        x = c * cell_w
-        cv2.line(grid, (x, 0), (x, h), (24, 165, 135), 1)
+    # 1px lines are whole rows/columns, so write them with two fancy-index assignments
+    ys = np.arange(1, rows) * cell_h
+    xs = np.arange(1, cols) * cell_w
+    grid[ys[ys < h]] = (24, 165, 135)
+    grid[:, xs[xs < w]] = (24, 165, 135)
 
     return grid
 
 def detect_objects(img_bgr, min_area=500):
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5,5), 0)
-    edges = cv2.Canny(blur, 50, 150)
+    # Find edges/contours at half resolution (4x fewer pixels), then scale boxes back up.
+    # pyrDown already applies a 5x5 Gaussian, so Canny needs no separate blur pass.
+    cv2 = _cv2()
+    small = cv2.pyrDown(img_bgr)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150, L2gradient=False)
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
+    # Threshold all contour areas at once, then only visit the survivors
+    areas = np.fromiter((cv2.contourArea(c) for c in contours), dtype=np.float32, count=len(contours))
+    keep = np.flatnonzero(areas > min_area / 4)
+
     out = img_bgr.copy()
-    count = 0
+    for i in keep:
+        x,y,w,h = (2 * v for v in cv2.boundingRect(contours[i]))
+        cv2.rectangle(out, (x,y), (x+w, y+h), (24,165,135), 2)
 
-    for c in contours:
-        area = cv2.contourArea(c)
-        if area > min_area:
-            x,y,w,h = cv2.boundingRect(c)
-            cv2.rectangle(out, (x,y), (x+w, y+h), (24,165,135), 2)
-            count += 1
+    return out, len(keep)
 
-    return out, count
+# ---------- Frame explorer ----------
+@st.cache_resource(max_entries=16, show_spinner=False)
+def frame_bundle(_video_reader, video_path, index):
+    """
+    Every Frame Explorer image of one frame, JPEG-encoded once per (path, index)
+    so tab switches and rotate-angle clicks only look results up.
+    """
+    bgr = _decode_bgr(_video_reader, video_path, index)
+    h, w = bgr.shape[:2]
+    split = int(w * 0.8)
+    detected, count = detect_objects(bgr)
+    return {
+        "preview": preview_jpeg(bgr),
+        "gray": encode_jpeg(to_grayscale(bgr)),
+        "rotated": {angle: encode_jpeg(rotate_image(bgr, angle)) for angle in (90, 180, 270)},
+        "mirror": encode_jpeg(mirror_image(bgr)),
+        "grid": encode_jpeg(make_grid(bgr)),
+        "detected": encode_jpeg(detected),
+        "count": count,
+        # Crops are views into the decoded frame, encoded straight from BGR
+        "cuts": {
+            "Left 50%": encode_jpeg(bgr[:, :w//2]),
+            "Right 50%": encode_jpeg(bgr[:, w//2:]),
+            "Top 50%": encode_jpeg(bgr[:h//2, :]),
+            "Bottom 50%": encode_jpeg(bgr[h//2:, :]),
+            "80%": encode_jpeg(bgr[:, :split]),
+            "20%": encode_jpeg(bgr[:, split:]),
+        },
+    }
+
+
+@st.fragment
+def frame_explorer(video_reader, video_path, duration):
+    """
+    Timestamp slider plus the per-frame tabs. Runs as a fragment, so moving
+    the slider or switching the rotate angle reruns only this panel, not the
+    whole page (KPIs, styling, audio lab).
+    """
+    default_time = float(duration / 2.0)
+    time_sec = st.slider(
+        "Select timestamp (seconds)",
+        min_value=0.0,
+        max_value=float(max(duration, 0.1)),
+        value=float(default_time),
+        step=0.5,
+    )
 
-# ---------- Styling ----------
+    # All variants of the selected frame (cached)
+    index = get_frame_index(video_reader, time_sec)
+    bundle = frame_bundle(video_reader, video_path, index)
+
+    frame_tabs = st.tabs(["Show", "Grayscale", "Rotate", "Mirror", "Grid", "Detect", "Cuts"])
+
+    # Show
+    with frame_tabs[0]:
+        st.markdown("<div class='card'><b>Original Frame</b></div>", unsafe_allow_html=True)
+        st.image(bundle["preview"], use_column_width=True)
+
+    # Grayscale
+    with frame_tabs[1]:
+        st.markdown("<div class='card'><b>Grayscale</b></div>", unsafe_allow_html=True)
+        st.image(bundle["gray"], use_column_width=True)
+
+    # Rotate
+    with frame_tabs[2]:
+        st.markdown("<div class='card'><b>Rotate</b></div>", unsafe_allow_html=True)
+        angle = st.radio("Choose angle", [90, 180, 270], horizontal=True)
+        st.image(bundle["rotated"][angle], use_column_width=True)
+
+    # Mirror
+    with frame_tabs[3]:
+        st.markdown("<div class='card'><b>Mirror (Horizontal)</b></div>", unsafe_allow_html=True)
+        st.image(bundle["mirror"], use_column_width=True)
+
+    # Grid
+    with frame_tabs[4]:
+        st.markdown("<div class='card'><b>Grid (4×4)</b></div>", unsafe_allow_html=True)
+        st.image(bundle["grid"], use_column_width=True)
+
+    # Detect
+    with frame_tabs[5]:
+        st.markdown("<div class='card'><b>Object Detection (No DL)</b></div>", unsafe_allow_html=True)
+        st.write(f"Objects detected: **{bundle['count']}**")
+        st.image(bundle["detected"], use_column_width=True)
+
+    # Cuts
+    with frame_tabs[6]:
+        st.markdown("<div class='card'><b>Cuts / Crops</b></div>", unsafe_allow_html=True)
+        cuts = bundle["cuts"]
+
+        colA, colB = st.columns(2)
+        with colA:
+            st.image(cuts["Left 50%"], caption="Left 50%", use_column_width=True)
+            st.image(cuts["Top 50%"], caption="Top 50%", use_column_width=True)
+        with colB:
+            st.image(cuts["Right 50%"], caption="Right 50%", use_column_width=True)
+            st.image(cuts["Bottom 50%"], caption="Bottom 50%", use_column_width=True)
+
+        st.write("### Vertical 80 / 20")
+        st.image(cuts["80%"], caption="80%", use_column_width=True)
+        st.image(cuts["20%"], caption="20%", use_column_width=True)
+
+# ---------- Audio job ----------
+AUDIO_POLL_SECONDS = 0.5
+
+
+def _audio_job_status(video_path, polling):
+    """Status of the background extraction for this video, then its result once done."""
+    job = st.session_state.get("audio_job")
+    if job is None or job["video_path"] != video_path:
+        return
+    if not job["future"].done():
+        st.info("Processing audio...")
+        return
+    if polling:
+        # One full rerun to drop the poll timer; the result is then rendered statically
+        st.rerun()
+    audio_bytes, mime = job["future"].result()
+    if audio_bytes is not None:
+        st.write(
+            f"Extracted segment: **{job['start']:.2f} s → {job['end']:.2f} s** at **{job['speed']}x** speed."
+        )
+        st.audio(audio_bytes, format=mime)
+        st.download_button(
+            "Download processed audio",
+            data=audio_bytes,
+            file_name=f"extracted_audio_{job['start']:.0f}-{job['end']:.0f}_{job['speed']}x.{job['fmt']}",
+            mime=mime,
+        )
+    else:
+        st.error("Failed to extract audio. The file may not contain a valid audio track or ffmpeg failed.")
+
+
+def audio_job_panel(video_path):
+    """
+    Audio job status as a fragment that polls only while extraction runs, so
+    waiting reruns this panel instead of the whole page (video preview included).
+    """
+    job = st.session_state.get("audio_job")
+    polling = job is not None and job["video_path"] == video_path and not job["future"].done()
+    panel = st.fragment(run_every=AUDIO_POLL_SECONDS if polling else None)(_audio_job_status)
+    panel(video_path, polling)
+
+
+# ---------- Styling (base colours come from .streamlit/config.toml) ----------
 st.markdown(
     """
     <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600;700&display=swap" rel="stylesheet">
@@ -228,16 +612,14 @@ st.markdown(
         --accent-2: #18a77a;
         --radius: 12px;
       }
-      html, body, [class*="css"] {
-        background-color: var(--page-bg) !important;
-        color: var(--text) !important;
-        font-family: "Poppins", sans-serif;
-      }
+      html, body, [class*="css"] { font-family: "Poppins", sans-serif; }
       .title-main { font-size: 36px; font-weight:700; margin:0; }
       .subtitle { color: var(--muted); font-size:16px; margin-top:6px; }
       .tagline { color: var(--muted); font-size:13px; margin-bottom:18px; }
       .card { background: var(--card-bg); border-radius: var(--radius); padding: 18px; box-shadow: 0 10px 30px rgba(2,6,23,0.6); }
       .kpi { display:inline-block; margin-right:12px; padding:10px 14px; border-radius:10px; background: rgba(255,255,255,0.03); }
+      .kpi-row { display:flex; gap:12px; }
+      .kpi-row .kpi { flex:1; margin-right:0; }
       .small-muted { color:var(--muted); font-size:13px; }
       .footer { text-align:center; color:var(--muted); margin-top:20px; font-size:13px; }
     </style>
@@ -279,41 +661,31 @@ if uploaded_file is None:
         unsafe_allow_html=True
     )
 else:
-    # Save file and open reader
+    # Save file and open reader (both cached, so reruns reuse them)
     video_path = save_uploaded_video(uploaded_file)
+    # A new upload replaces the previous one: drop its temp copy from disk
+    previous_path = st.session_state.get("video_path")
+    if previous_path is not None and previous_path != video_path:
+        remove_temp_file(previous_path)
+    st.session_state["video_path"] = video_path
     video_reader = load_video_reader(video_path)
     props = get_video_properties(video_reader, video_path)
 
-    # KPI row
-    c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
-    with c1:
-        res_text = f"{props['Width']} × {props['Height']}" if props["Width"] and props["Height"] else "Unknown"
-        st.markdown(
-            f"<div class='kpi card'><b>{res_text}</b>"
-            "<div class='small-muted'>Resolution</div></div>",
-            unsafe_allow_html=True
-        )
-    with c2:
-        dur_text = f"{props['Duration (s)']} s" if props["Duration (s)"] is not None else "Unknown"
-        st.markdown(
-            f"<div class='kpi card'><b>{dur_text}</b>"
-            "<div class='small-muted'>Duration</div></div>",
-            unsafe_allow_html=True
-        )
-    with c3:
-        fps_text = f"{props['FPS']}" if props["FPS"] is not None else "Unknown"
-        st.markdown(
-            f"<div class='kpi card'><b>{fps_text}</b>"
-            "<div class='small-muted'>FPS</div></div>",
-            unsafe_allow_html=True
-        )
-    with c4:
-        has_audio = "Yes" if props["Has audio"] else "No"
-        st.markdown(
-            f"<div class='kpi card'><b>{has_audio}</b>"
-            "<div class='small-muted'>Audio Track</div></div>",
-            unsafe_allow_html=True
-        )
+    # KPI row (one element instead of four columns)
+    res_text = f"{props['Width']} × {props['Height']}" if props["Width"] and props["Height"] else "Unknown"
+    dur_text = f"{props['Duration (s)']} s" if props["Duration (s)"] is not None else "Unknown"
+    fps_text = f"{props['FPS']}" if props["FPS"] is not None else "Unknown"
+    has_audio = "Yes" if props["Has audio"] else "No"
+    kpi_cards = "".join(
+        f"<div class='kpi card'><b>{value}</b><div class='small-muted'>{label}</div></div>"
+        for value, label in [
+            (res_text, "Resolution"),
+            (dur_text, "Duration"),
+            (fps_text, "FPS"),
+            (has_audio, "Audio Track"),
+        ]
+    )
+    st.markdown(f"<div class='kpi-row'>{kpi_cards}</div>", unsafe_allow_html=True)
 
     # Tabs
     tabs = st.tabs(["Preview", "Frames", "Audio", "Properties"])
@@ -330,83 +702,7 @@ else:
         if duration is None or duration <= 0:
             st.warning("Could not determine video duration for frame selection.")
         else:
-            default_time = float(duration / 2.0)
-            time_sec = st.slider(
-                "Select timestamp (seconds)",
-                min_value=0.0,
-                max_value=float(max(duration, 0.1)),
-                value=float(default_time),
-                step=0.5,
-            )
-
-            # Get base frame
-            frame_img = get_frame_image(video_reader, time_sec)
-            frame_bgr = pil_to_bgr(frame_img)
-
-            frame_tabs = st.tabs(["Show", "Grayscale", "Rotate", "Mirror", "Grid", "Detect", "Cuts"])
-
-            # Show
-            with frame_tabs[0]:
-                st.markdown("<div class='card'><b>Original Frame</b></div>", unsafe_allow_html=True)
-                st.image(frame_img, use_column_width=True)
-
-            # Grayscale
-            with frame_tabs[1]:
-                st.markdown("<div class='card'><b>Grayscale</b></div>", unsafe_allow_html=True)
-                gray = to_grayscale(frame_bgr)
-                st.image(gray, use_column_width=True)
-
-            # Rotate
-            with frame_tabs[2]:
-                st.markdown("<div class='card'><b>Rotate</b></div>", unsafe_allow_html=True)
-                angle = st.radio("Choose angle", [90, 180, 270], horizontal=True)
-                rotated = rotate_image(frame_bgr, angle)
-                st.image(bgr_to_pil(rotated), use_column_width=True)
-
-            # Mirror
-            with frame_tabs[3]:
-                st.markdown("<div class='card'><b>Mirror (Horizontal)</b></div>", unsafe_allow_html=True)
-                mirrored = mirror_image(frame_bgr)
-                st.image(bgr_to_pil(mirrored), use_column_width=True)
-
-            # Grid
-            with frame_tabs[4]:
-                st.markdown("<div class='card'><b>Grid (4×4)</b></div>", unsafe_allow_html=True)
-                grid_img = make_grid(frame_bgr)
-                st.image(bgr_to_pil(grid_img), use_column_width=True)
-
-            # Detect
-            with frame_tabs[5]:
-                st.markdown("<div class='card'><b>Object Detection (No DL)</b></div>", unsafe_allow_html=True)
-                detected, count = detect_objects(frame_bgr)
-                st.write(f"Objects detected: **{count}**")
-                st.image(bgr_to_pil(detected), use_column_width=True)
-
-            # Cuts
-            with frame_tabs[6]:
-                st.markdown("<div class='card'><b>Cuts / Crops</b></div>", unsafe_allow_html=True)
-                h, w = frame_bgr.shape[:2]
-
-                left = frame_bgr[:, :w//2]
-                right = frame_bgr[:, w//2:]
-                top = frame_bgr[:h//2, :]
-                bottom = frame_bgr[h//2:, :]
-
-                split = int(w * 0.8)
-                p80 = frame_bgr[:, :split]
-                p20 = frame_bgr[:, split:]
-
-                colA, colB = st.columns(2)
-                with colA:
-                    st.image(bgr_to_pil(left), caption="Left 50%", use_column_width=True)
-                    st.image(bgr_to_pil(top), caption="Top 50%", use_column_width=True)
-                with colB:
-                    st.image(bgr_to_pil(right), caption="Right 50%", use_column_width=True)
-                    st.image(bgr_to_pil(bottom), caption="Bottom 50%", use_column_width=True)
-
-                st.write("### Vertical 80 / 20")
-                st.image(bgr_to_pil(p80), caption="80%", use_column_width=True)
-                st.image(bgr_to_pil(p20), caption="20%", use_column_width=True)
+            frame_explorer(video_reader, video_path, duration)
 
     # Audio
     with tabs[2]:
@@ -433,39 +729,48 @@ else:
                 step=0.5,
             )
 
+            # Fast copy keeps the original audio packets (no re-encode)
+            fast_copy = False
+            if props["Audio codec"] in COPY_AUDIO_FORMATS:
+                fast_copy = st.checkbox(
+                    f"Fast copy (keep original {props['Audio codec']} audio, no speed change)",
+                    value=False,
+                )
+
             # Speed selector
             speed = st.select_slider(
                 "Playback speed (affects output audio)",
                 options=[0.5, 0.75, 1.0, 1.25, 1.5, 2.0],
                 value=1.0,
+                disabled=fast_copy,
             )
 
             # Format selector
-            fmt = st.radio("Output format", ["mp3", "wav"], horizontal=True)
+            fmt = st.radio("Output format", ["mp3", "wav"], horizontal=True, disabled=fast_copy)
+            if fast_copy:
+                speed = 1.0
+                fmt = props["Audio codec"]
 
             if st.button("Extract audio with settings"):
-                with st.spinner("Processing audio..."):
-                    audio_bytes, mime = extract_audio_bytes(
-                        video_path,
-                        format_ext=fmt,
-                        speed=speed,
-                        start_time=start_sec,
-                        end_time=end_sec,
-                    )
-
-                if audio_bytes is not None:
-                    st.write(
-                        f"Extracted segment: **{start_sec:.2f} s → {end_sec:.2f} s** at **{speed}x** speed."
-                    )
-                    st.audio(audio_bytes, format=mime)
-                    st.download_button(
-                        "Download processed audio",
-                        data=audio_bytes,
-                        file_name=f"extracted_audio_{start_sec:.0f}-{end_sec:.0f}_{speed}x.{fmt}",
-                        mime=mime,
-                    )
-                else:
-                    st.error("Failed to extract audio. The file may not contain a valid audio track or ffmpeg failed.")
+                future = get_audio_executor().submit(
+                    extract_audio_bytes,
+                    video_path,
+                    format_ext=fmt,
+                    speed=speed,
+                    start_time=start_sec,
+                    end_time=end_sec,
+                    copy=fast_copy,
+                )
+                st.session_state["audio_job"] = {
+                    "future": future,
+                    "video_path": video_path,
+                    "start": start_sec,
+                    "end": end_sec,
+                    "speed": speed,
+                    "fmt": fmt,
+                }
+
+            audio_job_panel(video_path)
 
     # Properties
     with tabs[3]:
@@ -473,11 +778,5 @@ else:
         for k, v in props.items():
             st.write(f"**{k}:** {v}")
 
-    # Close reader
-    try:
-        video_reader.close()
-    except Exception:
-        pass
-
 # Footer
 st.markdown("<div class='footer'>Built for Practical • Practical Video Lab</div>", unsafe_allow_html=True)